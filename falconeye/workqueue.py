@@ -0,0 +1,476 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# Dequeue queries used by SQLiteWorkQueue.get(), each served by an index:
+# expired leases and due retries by urls_state (state, expires_at), new URLs by urls_pending (state, added_at)
+_SELECT_EXPIRED_LEASES = (
+    "SELECT url, attempts FROM urls WHERE state = 'leased' AND expires_at <= ?"
+    " ORDER BY expires_at LIMIT ?"
+)
+_SELECT_DUE_RETRIES = (
+    "SELECT url, attempts FROM urls WHERE state = 'retry' AND expires_at <= ?"
+    " ORDER BY expires_at LIMIT ?"
+)
+_SELECT_PENDING = (
+    "SELECT url, attempts FROM urls WHERE state = 'pending'"
+    " ORDER BY added_at, rowid LIMIT ?"
+)
+_SELECT_UNFINISHED = "SELECT 1 FROM urls WHERE state IN ('pending', 'retry', 'leased') LIMIT 1"
+
+
+class Lease:
+    """
+    A single URL handed out by a work queue to one worker.
+
+    Attributes:
+        url (str): The URL to be processed.
+        lease_id (str): Token identifying this lease. Needed to ack or release the URL.
+        attempts (int): How many times the URL has been leased, including this one.
+        expires_at (float): Unix timestamp after which the URL becomes visible to other workers again.
+    """
+
+    def __init__(self, url, lease_id, attempts, expires_at):
+        self.url = url
+        self.lease_id = lease_id
+        self.attempts = attempts
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"Lease(url={self.url!r}, lease_id={self.lease_id!r}, attempts={self.attempts})"
+
+
+class WorkQueue:
+    """
+    Interface of a shared URL work queue.
+
+    A backend has to keep every URL it has ever seen, so that put() can skip
+    duplicates across all workers, and hand out URLs with lease/ack semantics:
+    a leased URL is hidden from other workers until it is acked, released, or
+    its visibility timeout runs out (e.g. because the worker crashed).
+    """
+
+    def put(self, urls):
+        """
+        Adds URLs to the queue, skipping ones that were already seen.
+
+        Args:
+            urls (str or list): A single URL or a list of URLs.
+
+        Returns:
+            int: The number of URLs actually added.
+        """
+        raise NotImplementedError
+
+    def get(self, batch_size=1, visibility_timeout=60):
+        """
+        Leases up to batch_size URLs.
+
+        Args:
+            batch_size (int, optional): Maximum number of URLs to lease. Default: 1.
+            visibility_timeout (float, optional): Seconds after which an unacked lease expires. Default: 60.
+
+        Returns:
+            list: A list of Lease objects, or an empty list if nothing is available.
+        """
+        raise NotImplementedError
+
+    def ack(self, lease):
+        """
+        Marks a leased URL as done.
+
+        Args:
+            lease (Lease): The lease returned by get().
+
+        Returns:
+            bool: True if acked, False if the lease has expired or is unknown.
+        """
+        raise NotImplementedError
+
+    def release(self, lease, failed=False, delay=None):
+        """
+        Gives a leased URL back to the queue without completing it.
+
+        Args:
+            lease (Lease): The lease returned by get().
+            failed (bool, optional): If True, the URL is marked as failed and never handed out again. Default: False.
+            delay (float, optional): Seconds before the URL can be leased again.
+                                     If None, the backend's default retry delay is used.
+
+        Returns:
+            bool: True if released, False if the lease has expired or is unknown.
+        """
+        raise NotImplementedError
+
+    def extend(self, lease, visibility_timeout=60):
+        """
+        Pushes back the expiry of a lease that is still being worked on.
+
+        Args:
+            lease (Lease): The lease returned by get().
+            visibility_timeout (float, optional): New timeout in seconds, counted from now. Default: 60.
+
+        Returns:
+            bool: True if extended, False if the lease has expired or is unknown.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Counts URLs by state.
+
+        Returns:
+            dict: Mapping with the keys 'pending', 'leased', 'done' and 'failed'.
+        """
+        raise NotImplementedError
+
+    def seen(self, url):
+        """
+        Checks whether a URL has ever been added to the queue, in any state.
+
+        Args:
+            url (str): The URL to check.
+
+        Returns:
+            bool: True if the URL is known to the queue.
+        """
+        raise NotImplementedError
+
+    def remaining(self):
+        """
+        Returns:
+            int: The number of URLs that are not done or failed yet.
+        """
+        counts = self.stats()
+        return counts['pending'] + counts['leased']
+
+    def is_drained(self):
+        """
+        Checks whether every URL is done or failed. Backends should override
+        this with something cheaper than counting all URLs, as workers call it on every idle poll.
+
+        Returns:
+            bool: True if no URL is pending, waiting for a retry or leased.
+        """
+        return self.remaining() == 0
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Work queue stored in a single SQLite file.
+
+    Every call opens its own connection, so one instance can be shared between
+    threads, and several processes on the same host can point at the same file.
+    Leasing runs inside an immediate transaction, which makes SQLite serialize
+    concurrent dequeues and guarantees a URL is leased to only one worker at a time.
+
+    Args:
+        path (str): Path to the database file. Created if it does not exist.
+        max_attempts (int, optional): After this many leases a released URL is marked as failed. Default: 3.
+        timeout (float, optional): Seconds to wait for a database lock held by another worker. Default: 30.
+        retry_delay (float, optional): Seconds a released URL waits before it can be leased again. Default: 10.
+    """
+
+    def __init__(self, path, max_attempts=3, timeout=30, retry_delay=10):
+        if not isinstance(path, str):
+            raise TypeError(f"Argument 'path' must be a string. Retrieved: {type(path)}")
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " lease_id TEXT,"
+                " expires_at REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " added_at REAL NOT NULL)"
+            )
+            # Released URLs wait in the 'retry' state until expires_at, leased ones until their lease runs out
+            conn.execute("CREATE INDEX IF NOT EXISTS urls_state ON urls (state, expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS urls_pending ON urls (state, added_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        return _Connection(conn)
+
+    def put(self, urls):
+        if isinstance(urls, str):
+            urls = [urls]
+        if not isinstance(urls, (list, tuple, set)):
+            print(f"\nError: Argument 'urls' must be a string or a list of strings. Retrieved: {type(urls)}\n")
+            return 0
+        urls = [url for url in urls if isinstance(url, str) and url]
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, added_at) VALUES (?, ?)",
+                [(url, now) for url in urls]
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        return added
+
+    def get(self, batch_size=1, visibility_timeout=60):
+        if not isinstance(batch_size, int) or batch_size < 1:
+            print(f"\nError: Argument 'batch_size' must be a positive integer. Retrieved: {batch_size!r}\n")
+            return []
+        if not _is_positive_number(visibility_timeout):
+            print(f"\nError: Argument 'visibility_timeout' must be a positive number. Retrieved: {visibility_timeout!r}\n")
+            return []
+
+        now = time.time()
+        expires_at = now + visibility_timeout
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # URLs whose lease has run out are handed out again, unless they have used up their attempts
+            conn.execute(
+                "UPDATE urls SET state = 'failed', lease_id = NULL, expires_at = NULL"
+                " WHERE state = 'leased' AND expires_at <= ? AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            # Each query runs on its own index, so the cost does not grow with the number of pending URLs
+            rows = []
+            for query, params in (
+                (_SELECT_EXPIRED_LEASES, (now,)),
+                (_SELECT_DUE_RETRIES, (now,)),
+                (_SELECT_PENDING, ()),
+            ):
+                if len(rows) >= batch_size:
+                    break
+                rows += conn.execute(query, params + (batch_size - len(rows),)).fetchall()
+            leases = []
+            for url, attempts in rows:
+                lease = Lease(url, uuid.uuid4().hex, attempts + 1, expires_at)
+                conn.execute(
+                    "UPDATE urls SET state = 'leased', lease_id = ?, expires_at = ?, attempts = ? WHERE url = ?",
+                    (lease.lease_id, lease.expires_at, lease.attempts, lease.url)
+                )
+                leases.append(lease)
+            conn.execute("COMMIT")
+        return leases
+
+    def _update_lease(self, lease, assignments, params):
+        # Only the current holder of an unexpired lease may change it
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE urls SET {assignments}"
+                " WHERE url = ? AND lease_id = ? AND state = 'leased' AND expires_at > ?",
+                params + (lease.url, lease.lease_id, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def ack(self, lease):
+        return self._update_lease(lease, "state = 'done', lease_id = NULL, expires_at = NULL", ())
+
+    def release(self, lease, failed=False, delay=None):
+        if failed or lease.attempts >= self.max_attempts:
+            return self._update_lease(lease, "state = 'failed', lease_id = NULL, expires_at = NULL", ())
+        if delay is None:
+            delay = self.retry_delay
+        return self._update_lease(
+            lease, "state = 'retry', lease_id = NULL, expires_at = ?", (time.time() + max(delay, 0),)
+        )
+
+    def extend(self, lease, visibility_timeout=60):
+        if not _is_positive_number(visibility_timeout):
+            print(f"\nError: Argument 'visibility_timeout' must be a positive number. Retrieved: {visibility_timeout!r}\n")
+            return False
+        expires_at = time.time() + visibility_timeout
+        if self._update_lease(lease, "expires_at = ?", (expires_at,)):
+            lease.expires_at = expires_at
+            return True
+        return False
+
+    def stats(self):
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT CASE"
+                " WHEN state = 'retry' THEN 'pending'"
+                " WHEN state = 'leased' AND expires_at <= ? AND attempts < ? THEN 'pending'"
+                " WHEN state = 'leased' AND expires_at <= ? THEN 'failed'"
+                " ELSE state END AS effective_state, COUNT(*)"
+                " FROM urls GROUP BY effective_state",
+                (now, self.max_attempts, now)
+            ).fetchall()
+        for state, count in rows:
+            counts[state] = count
+        return counts
+
+    def seen(self, url):
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone()
+        return row is not None
+
+    def is_drained(self):
+        # Expired leases that used up their attempts still count here; the next get() marks them as failed
+        with self._connect() as conn:
+            row = conn.execute(_SELECT_UNFINISHED).fetchone()
+        return row is None
+
+
+def _is_positive_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+class _Connection:
+    """Closes the wrapped sqlite3 connection on exit and rolls back an open transaction on error."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+        finally:
+            self._conn.close()
+        return False
+
+
+def run_workers(queue, handler, concurrency=4, batch_size=1, visibility_timeout=60, poll_interval=1.0, idle_timeout=None):
+    """
+    Drains a work queue by calling handler for every leased URL in a pool of threads.
+
+    The handler receives the URL and may return a list of newly discovered URLs,
+    which are put back into the queue (duplicates are skipped by the queue).
+    A URL is acked when the handler returns anything other than False, and
+    released for a retry when it returns False or raises an exception.
+    While a URL is being handled, its lease (and the rest of its batch) is
+    extended in the background, so slow handlers do not lose their URLs.
+    Several processes or hosts can run this against the same queue.
+
+    Args:
+        queue (WorkQueue): The queue to drain.
+        handler (callable): Function taking a URL (str).
+        concurrency (int, optional): Number of worker threads. Default: 4.
+        batch_size (int, optional): Number of URLs each thread leases at once. Default: 1.
+        visibility_timeout (float, optional): Seconds a leased URL stays hidden from other workers. Default: 60.
+        poll_interval (float, optional): Seconds to wait when other workers still hold leases. Default: 1.0.
+        idle_timeout (float, optional): Stop after this many seconds without getting any work,
+                                        even if URLs are still leased elsewhere. If None, wait until the queue is drained.
+
+    Returns:
+        dict: Counts of 'processed' (acked), 'released' and 'lost' leases handled by this call.
+        A released URL is retried later or, once it has used up its attempts, marked as failed in the queue;
+        use queue.stats() to see how many URLs failed for good.
+        A URL is lost when its lease expired or could not be acked or released, so another worker may handle it again.
+    """
+    results = {'processed': 0, 'released': 0, 'lost': 0}
+    if not isinstance(queue, WorkQueue):
+        print(f"\nError: Argument 'queue' must be a WorkQueue. Retrieved: {type(queue)}\n")
+        return results
+    if not callable(handler):
+        print(f"\nError: Argument 'handler' must be callable. Retrieved: {type(handler)}\n")
+        return results
+    if not isinstance(concurrency, int) or concurrency < 1:
+        print(f"\nError: Argument 'concurrency' must be a positive integer. Retrieved: {concurrency!r}\n")
+        return results
+    if not isinstance(batch_size, int) or batch_size < 1:
+        print(f"\nError: Argument 'batch_size' must be a positive integer. Retrieved: {batch_size!r}\n")
+        return results
+    if not _is_positive_number(visibility_timeout):
+        print(f"\nError: Argument 'visibility_timeout' must be a positive number. Retrieved: {visibility_timeout!r}\n")
+        return results
+    if not _is_positive_number(poll_interval):
+        print(f"\nError: Argument 'poll_interval' must be a positive number. Retrieved: {poll_interval!r}\n")
+        return results
+    if idle_timeout is not None and not _is_positive_number(idle_timeout):
+        print(f"\nError: Argument 'idle_timeout' must be a positive number or None. Retrieved: {idle_timeout!r}\n")
+        return results
+
+    results_lock = threading.Lock()
+    held = set() # Leases taken by any worker thread and not yet acked or released
+    held_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def report(message, e):
+        print(f"\nError: {message}")
+        print(f"Error type: {type(e).__name__}")
+        print(f"Details: {e}\n")
+
+    def heartbeat():
+        # Extends every held lease well before it runs out
+        while not stopped.wait(visibility_timeout / 3):
+            with held_lock:
+                leases = list(held)
+            for lease in leases:
+                try:
+                    queue.extend(lease, visibility_timeout=visibility_timeout)
+                except Exception as e:
+                    report(f"While extending the lease for URL: {lease.url}", e)
+
+    def handle(lease):
+        try:
+            found = handler(lease.url)
+        except Exception as e:
+            report(f"While processing URL: {lease.url}", e)
+            found = False
+
+        try:
+            if found is False:
+                key = 'released' if queue.release(lease) else 'lost'
+            else:
+                if isinstance(found, (list, tuple, set)):
+                    queue.put(list(found))
+                key = 'processed' if queue.ack(lease) else 'lost'
+        except Exception as e:
+            report(f"While returning URL to the queue: {lease.url}", e)
+            key = 'lost'
+        finally:
+            with held_lock:
+                held.discard(lease)
+        with results_lock:
+            results[key] += 1
+
+    def work():
+        idle_since = None
+        while True:
+            try:
+                leases = queue.get(batch_size=batch_size, visibility_timeout=visibility_timeout)
+                if leases:
+                    idle_since = None
+                    with held_lock:
+                        held.update(leases)
+                    for lease in leases:
+                        handle(lease)
+                    continue
+                if queue.is_drained():
+                    return
+                # Other workers still hold leases; they may add URLs or their leases may expire
+            except Exception as e:
+                # E.g. the database stayed locked; back off and try again
+                report("While reading from the work queue", e)
+            if idle_since is None:
+                idle_since = time.time()
+            elif idle_timeout is not None and time.time() - idle_since >= idle_timeout:
+                return
+            time.sleep(poll_interval)
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stopped.set()
+    heartbeat_thread.join()
+    return results
@@ -0,0 +1,293 @@
+import unittest
+from falconeye import workqueue
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+
+def _drain_in_process(path, output_path):
+    # Runs in a separate process; writes every URL it handled to its own file
+    queue = workqueue.SQLiteWorkQueue(path)
+    handled = []
+    workqueue.run_workers(queue, handled.append, concurrency=2, batch_size=3, poll_interval=0.05)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(handled))
+
+
+class TestSQLiteWorkQueue(unittest.TestCase):
+
+    def setUp(self): # Każdy test dostaje własną bazę w katalogu tymczasowym
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "queue.db")
+        self.queue = workqueue.SQLiteWorkQueue(self.path, max_attempts=2, retry_delay=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_put_skips_duplicates(self):
+        self.assertEqual(self.queue.put(['https://a.com', 'https://b.com', 'https://a.com']), 2)
+        self.assertEqual(self.queue.put('https://b.com'), 0)
+        self.assertTrue(self.queue.seen('https://a.com'))
+        self.assertFalse(self.queue.seen('https://c.com'))
+
+    def test_put_skips_done_urls(self):
+        self.queue.put('https://a.com')
+        lease = self.queue.get()[0]
+        self.assertTrue(self.queue.ack(lease))
+        self.assertEqual(self.queue.put('https://a.com'), 0) # Już przetworzony URL nie wraca do kolejki
+        self.assertEqual(self.queue.get(), [])
+
+    def test_put_invalid_urls_type(self):
+        self.assertEqual(self.queue.put(123), 0)
+
+    def test_get_batch(self):
+        self.queue.put(['https://a.com', 'https://b.com', 'https://c.com'])
+        leases = self.queue.get(batch_size=2)
+        self.assertEqual([lease.url for lease in leases], ['https://a.com', 'https://b.com'])
+        self.assertEqual(self.queue.stats(), {'pending': 1, 'leased': 2, 'done': 0, 'failed': 0})
+
+    def test_get_invalid_batch_size(self):
+        self.queue.put('https://a.com')
+        self.assertEqual(self.queue.get(batch_size=0), [])
+
+    def test_get_invalid_visibility_timeout(self):
+        self.queue.put('https://a.com')
+        self.assertEqual(self.queue.get(visibility_timeout=None), [])
+        self.assertEqual(self.queue.get(visibility_timeout='60'), [])
+        self.assertEqual(self.queue.get(visibility_timeout=0), []) # Dzierżawa wygasłaby od razu
+        self.assertEqual(self.queue.stats()['pending'], 1)
+
+    def test_get_prefers_expired_leases_and_keeps_fifo_order(self):
+        self.queue.put(['https://a.com', 'https://b.com'])
+        self.queue.get(visibility_timeout=0.05)
+        self.queue.put('https://c.com')
+        time.sleep(0.1)
+        leases = self.queue.get(batch_size=3)
+        self.assertEqual([lease.url for lease in leases], ['https://a.com', 'https://b.com', 'https://c.com'])
+
+    def test_queries_use_indexes(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            for query, params in (
+                (workqueue._SELECT_EXPIRED_LEASES, (0, 1)),
+                (workqueue._SELECT_DUE_RETRIES, (0, 1)),
+                (workqueue._SELECT_PENDING, (1,)),
+                (workqueue._SELECT_UNFINISHED, ()),
+            ):
+                plan = str(conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall())
+                self.assertIn('USING', plan) # Bez przeszukiwania całej tabeli
+                self.assertNotIn('SCAN', plan)
+                self.assertNotIn('TEMP B-TREE', plan) # Bez sortowania całej kolejki przy każdym get()
+        finally:
+            conn.close()
+
+    def test_is_drained(self):
+        self.assertTrue(self.queue.is_drained())
+        self.queue.put('https://a.com')
+        self.assertFalse(self.queue.is_drained())
+        lease = self.queue.get()[0]
+        self.assertFalse(self.queue.is_drained())
+        self.queue.ack(lease)
+        self.assertTrue(self.queue.is_drained())
+
+    def test_leased_url_is_hidden(self):
+        self.queue.put('https://a.com')
+        self.assertEqual(len(self.queue.get()), 1)
+        self.assertEqual(self.queue.get(), [])
+
+    def test_expired_lease_is_redelivered(self):
+        self.queue.put('https://a.com')
+        first = self.queue.get(visibility_timeout=0.05)[0]
+        time.sleep(0.1)
+        second = self.queue.get()[0]
+        self.assertEqual(second.url, 'https://a.com')
+        self.assertEqual(second.attempts, 2)
+        self.assertFalse(self.queue.ack(first)) # Stara dzierżawa nie może już potwierdzić URL-a
+        self.assertTrue(self.queue.ack(second))
+
+    def test_expired_lease_fails_after_max_attempts(self):
+        self.queue.put('https://a.com')
+        for _ in range(2):
+            self.queue.get(visibility_timeout=0.05)
+            time.sleep(0.1)
+        self.assertEqual(self.queue.get(), [])
+        self.assertEqual(self.queue.stats()['failed'], 1)
+        self.assertEqual(self.queue.remaining(), 0)
+
+    def test_release_retries_then_fails(self):
+        self.queue.put('https://a.com')
+        self.assertTrue(self.queue.release(self.queue.get()[0]))
+        self.assertEqual(self.queue.stats()['pending'], 1)
+        self.assertTrue(self.queue.release(self.queue.get()[0]))
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+    def test_release_waits_for_retry_delay(self):
+        queue = workqueue.SQLiteWorkQueue(self.path, retry_delay=0.1)
+        queue.put('https://a.com')
+        self.assertTrue(queue.release(queue.get()[0]))
+        self.assertEqual(queue.get(), []) # URL nie wraca od razu do kolejki
+        self.assertEqual(queue.stats()['pending'], 1)
+        time.sleep(0.15)
+        self.assertEqual(queue.get()[0].attempts, 2)
+
+    def test_release_explicit_delay(self):
+        self.queue.put('https://a.com')
+        self.assertTrue(self.queue.release(self.queue.get()[0], delay=60))
+        self.assertEqual(self.queue.get(), [])
+
+    def test_release_failed(self):
+        self.queue.put('https://a.com')
+        self.assertTrue(self.queue.release(self.queue.get()[0], failed=True))
+        self.assertEqual(self.queue.get(), [])
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+    def test_extend(self):
+        self.queue.put('https://a.com')
+        lease = self.queue.get(visibility_timeout=0.05)[0]
+        self.assertTrue(self.queue.extend(lease, visibility_timeout=60))
+        time.sleep(0.1)
+        self.assertEqual(self.queue.get(), [])
+        self.assertTrue(self.queue.ack(lease))
+
+    def test_extend_invalid_visibility_timeout(self):
+        self.queue.put('https://a.com')
+        lease = self.queue.get()[0]
+        self.assertFalse(self.queue.extend(lease, visibility_timeout=None))
+        self.assertFalse(self.queue.extend(lease, visibility_timeout=-1))
+
+    def test_shared_between_instances(self):
+        other = workqueue.SQLiteWorkQueue(self.path)
+        self.queue.put('https://a.com')
+        self.assertEqual(other.put('https://a.com'), 0)
+        lease = other.get()[0]
+        self.assertEqual(self.queue.get(), [])
+        self.assertTrue(self.queue.ack(lease))
+
+    def test_invalid_path_type(self):
+        with self.assertRaises(TypeError):
+            workqueue.SQLiteWorkQueue(123)
+
+
+class TestRunWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "queue.db")
+        self.queue = workqueue.SQLiteWorkQueue(self.path, max_attempts=2, retry_delay=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_workers_drains_queue(self):
+        urls = [f"https://example.com/{i}" for i in range(20)]
+        self.queue.put(urls)
+        handled = []
+        results = workqueue.run_workers(self.queue, handled.append, concurrency=4, batch_size=3)
+        self.assertEqual(sorted(handled), sorted(urls)) # Każdy URL przetworzony dokładnie raz
+        self.assertEqual(results, {'processed': 20, 'released': 0, 'lost': 0})
+        self.assertEqual(self.queue.stats()['done'], 20)
+
+    def test_run_workers_enqueues_discovered_urls(self):
+        self.queue.put('https://example.com/')
+        links = {'https://example.com/': ['https://example.com/a', 'https://example.com/b'],
+                 'https://example.com/a': ['https://example.com/', 'https://example.com/b']}
+        results = workqueue.run_workers(self.queue, lambda url: links.get(url, []), concurrency=2)
+        self.assertEqual(results['processed'], 3)
+        self.assertEqual(self.queue.stats()['done'], 3)
+
+    def test_run_workers_retries_failures(self):
+        self.queue.put(['https://ok.com', 'https://broken.com'])
+
+        def handler(url):
+            if 'broken' in url:
+                raise ValueError("boom")
+
+        results = workqueue.run_workers(self.queue, handler, concurrency=2)
+        self.assertEqual(results, {'processed': 1, 'released': 2, 'lost': 0}) # Dwie próby, potem URL oznaczony jako błędny
+        self.assertEqual(self.queue.stats(), {'pending': 0, 'leased': 0, 'done': 1, 'failed': 1})
+
+    def test_run_workers_handler_slower_than_visibility_timeout(self):
+        self.queue.put(['https://a.com', 'https://b.com'])
+        handled = []
+
+        def handler(url):
+            time.sleep(0.3)
+            handled.append(url)
+
+        results = workqueue.run_workers(self.queue, handler, concurrency=2, batch_size=2, visibility_timeout=0.2, poll_interval=0.05)
+        self.assertEqual(sorted(handled), ['https://a.com', 'https://b.com']) # Dzierżawy przedłużane, więc bez ponownego przetwarzania
+        self.assertEqual(results, {'processed': 2, 'released': 0, 'lost': 0})
+        self.assertEqual(self.queue.stats()['done'], 2)
+
+    def test_run_workers_counts_lost_leases(self):
+        class LosingQueue(workqueue.SQLiteWorkQueue):
+            def ack(self, lease):
+                return False # Symulujemy dzierżawę przejętą przez innego workera
+
+        queue = LosingQueue(self.path, max_attempts=2)
+        queue.put('https://a.com')
+        results = workqueue.run_workers(queue, lambda url: None, concurrency=1, visibility_timeout=0.05, poll_interval=0.05)
+        self.assertEqual(results, {'processed': 0, 'released': 0, 'lost': 2})
+        self.assertEqual(queue.stats()['failed'], 1)
+
+    def test_run_workers_survives_queue_errors(self):
+        class FlakyQueue(workqueue.SQLiteWorkQueue):
+            calls = 0
+
+            def get(self, batch_size=1, visibility_timeout=60):
+                FlakyQueue.calls += 1
+                if FlakyQueue.calls == 1:
+                    raise sqlite3.OperationalError("database is locked")
+                return super().get(batch_size, visibility_timeout)
+
+        queue = FlakyQueue(self.path)
+        queue.put(['https://a.com', 'https://b.com'])
+        results = workqueue.run_workers(queue, lambda url: None, concurrency=1, poll_interval=0.01)
+        self.assertEqual(results, {'processed': 2, 'released': 0, 'lost': 0})
+
+    def test_run_workers_invalid_visibility_timeout(self):
+        self.assertEqual(workqueue.run_workers(self.queue, print, visibility_timeout=0), {'processed': 0, 'released': 0, 'lost': 0})
+
+    def test_run_workers_idle_timeout(self):
+        self.queue.put('https://a.com')
+        self.queue.get() # URL zajęty przez innego, "zawieszonego" workera
+        results = workqueue.run_workers(self.queue, lambda url: None, concurrency=1, poll_interval=0.01, idle_timeout=0.05)
+        self.assertEqual(results, {'processed': 0, 'released': 0, 'lost': 0})
+
+    def test_run_workers_across_processes(self):
+        urls = [f"https://example.com/{i}" for i in range(30)]
+        self.queue.put(urls)
+        outputs = [os.path.join(self.tmp_dir, f"worker-{i}.txt") for i in range(2)]
+        processes = [multiprocessing.Process(target=_drain_in_process, args=(self.path, output)) for output in outputs]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0) # None oznacza zawieszony proces
+        handled = []
+        for output in outputs:
+            with open(output, 'r', encoding='utf-8') as f:
+                handled.extend(line for line in f.read().split("\n") if line)
+        self.assertEqual(sorted(handled), sorted(urls))
+
+    def test_run_workers_invalid_handler(self):
+        self.assertEqual(workqueue.run_workers(self.queue, None), {'processed': 0, 'released': 0, 'lost': 0})
+
+    def test_run_workers_invalid_concurrency(self):
+        self.assertEqual(workqueue.run_workers(self.queue, print, concurrency=0), {'processed': 0, 'released': 0, 'lost': 0})
+
+    def test_run_workers_invalid_batch_size(self):
+        self.queue.put('https://a.com')
+        self.assertEqual(workqueue.run_workers(self.queue, print, batch_size=0), {'processed': 0, 'released': 0, 'lost': 0})
+
+    def test_run_workers_invalid_poll_interval(self):
+        self.queue.put('https://a.com')
+        self.assertEqual(workqueue.run_workers(self.queue, print, poll_interval=None), {'processed': 0, 'released': 0, 'lost': 0})
+        self.assertEqual(workqueue.run_workers(self.queue, print, poll_interval='1'), {'processed': 0, 'released': 0, 'lost': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()